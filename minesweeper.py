@@ -1,6 +1,50 @@
 import itertools
 import random
-import copy
+import sys
+from collections import deque
+from collections.abc import MutableSet
+from functools import lru_cache
+
+import numpy as np
+
+
+def cells_from_mask(mask, width):
+    """
+    Yields the (i, j) cell for every set bit in a bitboard,
+    where bit i * width + j stands for cell (i, j).
+    """
+    while mask:
+        bit = mask & -mask
+        yield divmod(bit.bit_length() - 1, width)
+        mask ^= bit
+
+
+@lru_cache(maxsize=None)
+def _neighbors(i, j, height, width):
+    """
+    Returns the in-bounds neighbors of cell (i, j) on a board
+    of the given size, not including the cell itself.
+    """
+    return tuple(
+        (ni, nj)
+        for ni in range(max(0, i - 1), min(height, i + 2))
+        for nj in range(max(0, j - 1), min(width, j + 2))
+        if (ni, nj) != (i, j)
+    )
+
+
+def subset_differences(mask, count, others):
+    """
+    Yields the (mask, count) of every sentence that follows from
+    sentence (mask, count) and one of others, an iterable of
+    (mask, count) pairs, when one is a strict subset of the other.
+    """
+    for other_mask, other_count in others:
+        common = mask & other_mask
+        if common == other_mask != mask:
+            yield mask & ~other_mask, count - other_count
+        elif common == mask != other_mask:
+            yield other_mask & ~mask, other_count - count
 
 
 class Minesweeper():
@@ -8,28 +52,23 @@ class Minesweeper():
     Minesweeper game representation
     """
 
+    __slots__ = ("height", "width", "board", "mines", "mines_found")
+
     def __init__(self, height=8, width=8, mines=8):
 
         # Set initial width, height, and number of mines
         self.height = height
         self.width = width
-        self.mines = set()
 
         # Initialize an empty field with no mines
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
+        self.board = np.zeros((height, width), dtype=bool)
 
         # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        self.mines = set()
+        for position in random.sample(range(height * width), mines):
+            i, j = divmod(position, width)
+            self.mines.add((i, j))
+            self.board[i, j] = True
 
         # At first, player has found no mines
         self.mines_found = set()
@@ -39,19 +78,18 @@ class Minesweeper():
         Prints a text-based representation
         of where mines are located.
         """
-        for i in range(self.height):
-            print("--" * self.width + "-")
-            for j in range(self.width):
-                if self.board[i][j]:
-                    print("|X", end="")
-                else:
-                    print("| ", end="")
-            print("|")
-        print("--" * self.width + "-")
+        separator = "--" * self.width + "-\n"
+        rows = []
+        for row in self.board.tolist():
+            rows.append(separator)
+            rows.append("".join("|X" if mine else "| " for mine in row))
+            rows.append("|\n")
+        rows.append(separator)
+        sys.stdout.write("".join(rows))
 
     def is_mine(self, cell):
         i, j = cell
-        return self.board[i][j]
+        return bool(self.board[i, j])
 
     def nearby_mines(self, cell):
         """
@@ -59,24 +97,12 @@ class Minesweeper():
         within one row and column of a given cell,
         not including the cell itself.
         """
+        i, j = cell
 
-        # Keep count of nearby mines
-        count = 0
-
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
-
-        return count
+        # Sum the 3x3 block around cell, clipped to the board,
+        # then discount the cell itself
+        block = self.board[max(i - 1, 0):i + 2, max(j - 1, 0):j + 2]
+        return int(block.sum()) - int(self.board[i, j])
 
     def won(self):
         """
@@ -90,50 +116,171 @@ class Sentence():
     Logical statement about a Minesweeper game
     A sentence consists of a set of board cells,
     and a count of the number of those cells which are mines.
+    Given the board width, the cells are also kept as a bitmask
+    for fast comparisons.
     """
 
-    def __init__(self, cells, count):
+    __slots__ = (
+        "cells", "count", "width", "mask",
+        "_len", "_dirty", "_cached_mines", "_cached_safes"
+    )
+
+    def __init__(self, cells, count, width=None):
         self.cells = set(cells)
         self.count = count
+        self.width = width
+
+        # Bitmask of cells, bit i * width + j for cell (i, j),
+        # or None when the width is unknown
+        self.mask = None
+        if width is not None:
+            self.mask = 0
+            for i, j in self.cells:
+                self.mask |= 1 << (i * width + j)
+
+        # Cached size and known cells, recomputed only after marking
+        self._len = len(self.cells)
+        self._dirty = True
+        self._cached_mines = None
+        self._cached_safes = None
 
     def __eq__(self, other):
-        return self.cells == other.cells and self.count == other.count
+        if self.count != other.count:
+            return False
+
+        # Masks are only comparable when built for the same width
+        if self.mask is None or self.width != other.width:
+            return self.cells == other.cells
+        return self.mask == other.mask
 
     def __str__(self):
         return f"{self.cells} = {self.count}"
 
+    def _update_known(self):
+        """
+        Recomputes the cached known mines and safes.
+        """
+        self._cached_mines = self.cells if self._len == self.count else None
+        self._cached_safes = self.cells if self.count == 0 else None
+        self._dirty = False
+
     def known_mines(self):
         """
         Returns the set of all cells in self.cells known to be mines.
         """
-        if len(self.cells) == self.count:
-            return self.cells
+        if self._dirty:
+            self._update_known()
+        return self._cached_mines
 
     def known_safes(self):
         """
         Returns the set of all cells in self.cells known to be safe.
         """
-        if self.count == 0:
-            return self.cells
+        if self._dirty:
+            self._update_known()
+        return self._cached_safes
+
+    def determined(self):
+        """
+        Returns "mines" if all cells in self.cells are known to be mines,
+        "safes" if they are all known to be safe, and None otherwise.
+        """
+        if self.known_mines():
+            return "mines"
+        if self.known_safes():
+            return "safes"
+        return None
 
     def mark_mine(self, cell):
         """
         Updates internal knowledge representation given the fact that
         a cell is known to be a mine.
+
+        Returns what determined() returns if this change just made
+        the sentence determined, otherwise None.
         """
         if cell in self.cells:
+            was_determined = self.determined()
+
             # Remove cell from sentence and decrease count
             self.cells.remove(cell)
+            if self.mask is not None:
+                self.mask &= ~(1 << (cell[0] * self.width + cell[1]))
             self.count -= 1
+            self._len -= 1
+            self._dirty = True
+
+            if was_determined is None:
+                return self.determined()
 
     def mark_safe(self, cell):
         """
         Updates internal knowledge representation given the fact that
         a cell is known to be safe.
+
+        Returns what determined() returns if this change just made
+        the sentence determined, otherwise None.
         """
         if cell in self.cells:
+            was_determined = self.determined()
+
             # Remove cell from sentence
             self.cells.remove(cell)
+            if self.mask is not None:
+                self.mask &= ~(1 << (cell[0] * self.width + cell[1]))
+            self._len -= 1
+            self._dirty = True
+
+            if was_determined is None:
+                return self.determined()
+
+
+class CellSet(MutableSet):
+    """
+    Set of cells backed by one of a MinesweeperAI's bitboards.
+    Changes made through it write through to the bitboard.
+    """
+
+    __slots__ = ("_ai", "_name")
+
+    def __init__(self, ai, name):
+        self._ai = ai
+        self._name = name
+
+    def __contains__(self, cell):
+        i, j = cell
+        if not (0 <= i < self._ai.height and 0 <= j < self._ai.width):
+            return False
+        return bool(getattr(self._ai, self._name) & self._ai._bit((i, j)))
+
+    def __iter__(self):
+        return cells_from_mask(getattr(self._ai, self._name), self._ai.width)
+
+    def __len__(self):
+        return bin(getattr(self._ai, self._name)).count("1")
+
+    def __repr__(self):
+        return repr(set(self))
+
+    def add(self, cell):
+        setattr(self._ai, self._name,
+                getattr(self._ai, self._name) | self._ai._bit(cell))
+
+    def discard(self, cell):
+        if cell in self:
+            setattr(self._ai, self._name,
+                    getattr(self._ai, self._name) & ~self._ai._bit(cell))
+
+    def update(self, *others):
+        for other in others:
+            for cell in other:
+                self.add(cell)
+
+    def copy(self):
+        """
+        Returns a plain set of the cells, detached from the AI.
+        """
+        return set(self)
 
 
 class MinesweeperAI():
@@ -141,132 +288,210 @@ class MinesweeperAI():
     Minesweeper game player
     """
 
+    __slots__ = (
+        "height", "width",
+        "_moves_bb", "_mines_bb", "_safes_bb", "_all_bb",
+        "knowledge", "_by_cell", "_kb_keys",
+        "_worklist", "_pending_mines", "_pending_safes"
+    )
+
     def __init__(self, height=8, width=8):
 
         # Set initial height and width
         self.height = height
         self.width = width
 
-        # Keep track of which cells have been clicked on
-        self.moves_made = set()
+        # Keep track of which cells have been clicked on, and of cells
+        # known to be safe or mines, as bitboards with one bit per cell
+        # at index i * width + j
+        self._moves_bb = 0
+        self._mines_bb = 0
+        self._safes_bb = 0
 
-        # Keep track of cells known to be safe or mines
-        self.mines = set()
-        self.safes = set()
+        # Bitboard with every cell of the board set
+        self._all_bb = (1 << (height * width)) - 1
 
         # List of sentences about the game known to be true
         self.knowledge = []
 
+        # Sentences in the knowledge base indexed by the cells they mention
+        self._by_cell = {}
+
+        # (mask, count) keys of the sentences in the knowledge base
+        self._kb_keys = set()
+
+        # New or changed sentences awaiting inference, and cells
+        # awaiting marking once a sentence has determined them
+        self._worklist = deque()
+        self._pending_mines = set()
+        self._pending_safes = set()
+
+    @property
+    def moves_made(self):
+        """
+        Cells that have been clicked on.
+        """
+        return CellSet(self, "_moves_bb")
+
+    @moves_made.setter
+    def moves_made(self, cells):
+        self._moves_bb = self._mask(cells)
+
+    @property
+    def mines(self):
+        """
+        Cells known to be mines.
+        """
+        return CellSet(self, "_mines_bb")
+
+    @mines.setter
+    def mines(self, cells):
+        self._mines_bb = self._mask(cells)
+
+    @property
+    def safes(self):
+        """
+        Cells known to be safe.
+        """
+        return CellSet(self, "_safes_bb")
+
+    @safes.setter
+    def safes(self, cells):
+        self._safes_bb = self._mask(cells)
+
+    def _bit(self, cell):
+        """
+        Returns the bitboard bit standing for cell.
+        """
+        return 1 << (cell[0] * self.width + cell[1])
+
+    def _mask(self, cells):
+        """
+        Returns the bitboard with the bit of every cell in cells set.
+        """
+        mask = 0
+        for cell in cells:
+            mask |= self._bit(cell)
+        return mask
+
     def mark_mine(self, cell):
         """
         Marks a cell as a mine, and updates all knowledge
         to mark that cell as a mine as well.
         """
-        self.mines.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_mine(cell)
+        self._mines_bb |= self._bit(cell)
+        for sentence in self._by_cell.pop(cell, ()):
+            self._kb_keys.discard((sentence.mask, sentence.count))
+            signal = sentence.mark_mine(cell)
+            self._kb_keys.add((sentence.mask, sentence.count))
+            self._enqueue(sentence, signal)
 
     def mark_safe(self, cell):
         """
         Marks a cell as safe, and updates all knowledge
         to mark that cell as safe as well.
         """
-        self.safes.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_safe(cell)
+        self._safes_bb |= self._bit(cell)
+        for sentence in self._by_cell.pop(cell, ()):
+            self._kb_keys.discard((sentence.mask, sentence.count))
+            signal = sentence.mark_safe(cell)
+            self._kb_keys.add((sentence.mask, sentence.count))
+            self._enqueue(sentence, signal)
 
     def add_sentence(self, cell, count):
-        # Create set for nearby cells
-        nearby_cells = []
+        neighbors = _neighbors(*cell, self.height, self.width)
 
-        # Loop over all cells within one row and column of cell
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore already determined cells
-                if (i, j) in self.moves_made or (i, j) in self.safes:
-                    continue
-
-                # add cell in bounds to new_set
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    nearby_cells.append((i, j))
+        # Ignore already determined cells, counting off known mines
+        known = self._moves_bb | self._mines_bb | self._safes_bb
+        nearby_cells = tuple(n for n in neighbors if not known & self._bit(n))
+        count -= sum(1 for n in neighbors if self._mines_bb & self._bit(n))
 
         # Append sentence to knowledge base with set and count
-        self.knowledge.append(Sentence(nearby_cells, count))
-
-    def mark_cells(self, changed):
-        if not changed:
-            # Break recursion
-            return None
+        if nearby_cells:
+            self._append_sentence(Sentence(nearby_cells, count, self.width))
 
-        # Set variables
-        changed = False
-        mines = set()
-        safes = set()
+    def _append_sentence(self, sentence):
+        """
+        Adds a sentence to the knowledge base and indexes it
+        under each of its cells, unless an equal sentence is
+        already known. Returns True if the sentence was added.
+        """
+        key = (sentence.mask, sentence.count)
+        if key in self._kb_keys:
+            return False
+        self._kb_keys.add(key)
 
-        # Get all known mines and safes
-        for sentence in self.knowledge:
-            if sentence.known_mines():
-                mines = mines.union(sentence.known_mines())
-            if sentence.known_safes():
-                safes = safes.union(sentence.known_safes())
+        self.knowledge.append(sentence)
+        for cell in sentence.cells:
+            self._by_cell.setdefault(cell, []).append(sentence)
 
-        # Mark cells as mines and safes
-        for mine in mines:
-            self.mark_mine(mine)
-            changed = True
+        self._enqueue(sentence, sentence.determined())
+        return True
 
-        for safe in safes:
-            self.mark_safe(safe)
-            changed = True
+    def _enqueue(self, sentence, signal):
+        """
+        Queues a new or changed sentence for inference, or its cells
+        for marking if signal says they are all mines or all safe.
+        """
+        if signal == "mines":
+            self._pending_mines.update(sentence.cells)
+        elif signal == "safes":
+            self._pending_safes.update(sentence.cells)
+        else:
+            self._worklist.append(sentence)
 
-        # Infer new sentences from existing knowledge
-        self.infer_knowledge(changed)
+    def _propagate(self):
+        """
+        Marks any cells that can be concluded as safe or as mines,
+        and adds any sentences that can be inferred, until the
+        knowledge base reaches a fixpoint.
 
-    def infer_knowledge(self, changed):
-        if not changed:
-            # Break recursion
-            return None
+        Cells are marked as soon as a sentence reports them determined,
+        and only new or changed sentences are looked at for inference.
+        """
+        while True:
+            if self._pending_mines:
+                self.mark_mine(self._pending_mines.pop())
+            elif self._pending_safes:
+                self.mark_safe(self._pending_safes.pop())
+            elif self._worklist:
+                sentence = self._worklist.popleft()
+
+                # Sentence was emptied or determined by later marking
+                if not sentence.cells or sentence.determined() is not None:
+                    continue
 
-        changed = False
+                # Only sentences sharing a cell can be subsets either way
+                candidates = {
+                    id(other): other
+                    for cell in sentence.cells
+                    for other in self._by_cell[cell]
+                }
+
+                # Determined sentences are left to the marking stage
+                others = [
+                    (other.mask, other.count)
+                    for other in candidates.values()
+                    if other.determined() is None
+                ]
+
+                # Infer new sentences from subsets, in either direction
+                for key in subset_differences(sentence.mask, sentence.count, others):
+                    if key not in self._kb_keys:
+                        new_mask, new_count = key
+                        self._append_sentence(Sentence(
+                            cells_from_mask(new_mask, self.width),
+                            new_count,
+                            self.width
+                        ))
+            else:
+                break
 
         # Remove empty sentences
         for sentence in self.knowledge:
-            if sentence.cells == set():
-                self.knowledge.remove(sentence)
-
-        # Set variables
-        changed_sentences = []
-        found_subset = False
-        knowledge_copy = copy.deepcopy(self.knowledge)
-
-        # Look for subsets to infer new knowledge
-        for sentence1 in knowledge_copy:
-            for sentence2 in knowledge_copy:
-                if sentence1 == sentence2:
-                    continue
-
-                if sentence2.cells.issubset(sentence1.cells):
-                    found_subset = True
-                    new_set = sentence1.cells.difference(sentence2.cells)
-                    new_count = sentence1.count - sentence2.count
-                    new_sentence = Sentence(new_set, new_count)
-                    self.knowledge.append(new_sentence)
-
-            if found_subset:
-                # Register changed sentence
-                changed_sentences.append(sentence1)
-
-                # Knowledge base changed
-                changed = True
-
-        # Remove changed_sentences from knowledge base
-        for sentence in changed_sentences:
-            if sentence in self.knowledge:
-                self.knowledge.remove(sentence)
-
-        # Check for new cells to mark
-        self.mark_cells(changed)
+            if not sentence.cells:
+                self._kb_keys.discard((sentence.mask, sentence.count))
+        self.knowledge = [sentence for sentence in self.knowledge if sentence.cells]
 
     def add_knowledge(self, cell, count):
         """
@@ -283,13 +508,13 @@ class MinesweeperAI():
             5) add any new sentences to the AI's knowledge base
                if they can be inferred from existing knowledge
         """
-        self.moves_made.add(cell)
+        self._moves_bb |= self._bit(cell)
 
         self.mark_safe(cell)
 
         self.add_sentence(cell, count)
 
-        self.mark_cells(True)
+        self._propagate()
 
     def make_safe_move(self):
         """
@@ -299,20 +524,14 @@ class MinesweeperAI():
 
         This function may use the knowledge in self.mines, self.safes
         and self.moves_made, but should not modify any of those values.
+        It reads them through the bitboards that back those sets.
         """
         # Get a list of all available safe cells
-        safe_list = []
-
-        for i in range(self.height):
-            for j in range(self.width):
-                if (i, j) in self.safes and (i, j) not in self.moves_made and (i, j) not in self.mines:
-                    safe_list.append((i, j))
+        available = self._safes_bb & ~self._moves_bb & ~self._mines_bb
+        safe_list = tuple(cells_from_mask(available, self.width))
 
         # Return randomly selected safe move or None
-        if len(safe_list) != 0:
-            return random.choice(safe_list)
-        else:
-            return None
+        return random.choice(safe_list) if safe_list else None
 
     def make_random_move(self):
         """
@@ -322,15 +541,8 @@ class MinesweeperAI():
             2) are not known to be mines
         """
         # Get a list of all cells not already chosen and not mines
-        random_list = []
-
-        for i in range(self.height):
-            for j in range(self.width):
-                if (i, j) not in self.moves_made and (i, j) not in self.mines:
-                    random_list.append((i, j))
-
-        if len(random_list) == 0:
-            return None
+        available = self._all_bb & ~(self._moves_bb | self._mines_bb)
+        random_list = tuple(cells_from_mask(available, self.width))
 
-        # Return randomly selected move from list
-        return random.choice(random_list)
+        # Return randomly selected move or None
+        return random.choice(random_list) if random_list else None